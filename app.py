@@ -16,6 +16,9 @@ from nltk.corpus import stopwords
 import seaborn as sns
 from unidecode import unidecode # <--- 1. IMPORTAR UNIDECODE
 import openpyxl
+import hashlib
+import threading
+from sentence_transformers import SentenceTransformer
 
 nltk.download('stopwords', quiet=True)
 
@@ -24,6 +27,18 @@ nltk.download('stopwords', quiet=True)
 PASTA_JSON = "atendimento/"
 ARQUIVO_CSV_SAIDA = "emocao_clientes_todos.csv"
 PASTA_GRAFICOS = "graficos" 
+ARQUIVO_EMBEDDINGS = "embeddings_mensagens.npy"       # float32 (n_linhas x dim), memory-mapped
+ARQUIVO_EMBEDDINGS_CHAVES = "embeddings_chaves.npy"   # int64, uma chave por linha do CSV
+MODELO_EMBEDDINGS = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+IVF_MIN_MENSAGENS = 2000  # Abaixo disso a busca exata já é instantânea
+IVF_NPROBE = 4            # Quantos grupos (listas) são visitados por consulta
+IVF_AMOSTRA_TREINO = 20000  # Máximo de vetores usados para treinar os centroides do IVF
+ARQUIVO_CHECKPOINT = "checkpoint_processamento.csv"          # Resultados parciais do lote em andamento
+ARQUIVO_CHECKPOINT_PROGRESSO = "checkpoint_progresso.json"   # Marcador: arquivos já gravados no checkpoint
+CHECKPOINT_A_CADA_N_ARQUIVOS = 5
+MAX_PONTOS_GRAFICO = 120  # Acima disso as séries por data são reagrupadas (semana/mês)
+GRANULARIDADES = {"Dia": "D", "Semana": "W", "Mês": "MS"}
+NOMES_FREQUENCIAS = {freq: nome.lower() for nome, freq in GRANULARIDADES.items()}
 
 EMOCOES_MAP = {
     # Emoções primárias e mais comuns
@@ -61,6 +76,30 @@ EMOCOES_POSITIVAS = {"joy", "admiration", "amusement", "approval", "caring",
 EMOCOES_NEGATIVAS = {"sadness", "anger", "fear", "disgust", 
                      "disappointment", "disapproval", "remorse"}
 
+### NOVO: Pré-classificador por regras (cascata antes dos modelos) ###
+# Mensagens triviais são resolvidas aqui e não passam pelos dois modelos.
+# Cada regra: (nome, regex sobre o texto normalizado, emoção em EMOCOES_MAP).
+# A regex precisa casar com a mensagem INTEIRA, então só frases curtas e sem ambiguidade entram.
+# Uma regra só entra na cascata depois de concordar com os modelos no dataset gravado
+# (ver 'calibrar_pre_classificador'); a confiança gravada é a concordância medida.
+USAR_PRE_CLASSIFICADOR = True
+CONCORDANCIA_MINIMA_REGRA = 0.95
+AMOSTRAS_MINIMAS_REGRA = 5
+ARQUIVO_CALIBRACAO_REGRAS = "calibracao_regras.json"  # Medição congelada de cada regra
+REGRAS_PRE_CLASSIFICADOR = [
+    ("numero",        r"[\d\s]+",                                                              "neutral"),
+    ("risada",        r"(?:(?:k{2,}|(?:ka|ks|ha|he|hua){2,}|rs+)\s*)+",                          "amusement"),
+    ("saudacao",      r"(?:(?:oi+|ola+)\s*)?(?:bo[mn] dia+)?",                                   "neutral"),
+    ("agradecimento", r"(?:(?:ok|blz|beleza|show|certo|certinho)\s*)?(?:muito\s*)?"
+                      r"(?:obrigad[oa]+|brigad(?:o|a|ao)+|valeu+|vlw+|grat[oa])(?:\s*(?:mesmo|demais))?",
+                                                                                                 "gratitude"),
+    ("confirmacao",   r"(?:ok+|okay|blz|beleza|certo|certinho|pronto|feito|combinado|ta bom)",    "neutral"),
+]
+REGRAS_COMPILADAS = [(nome, re.compile(padrao), label) for nome, padrao, label in REGRAS_PRE_CLASSIFICADOR]
+# Letras, dígitos, espaços e pontuação comum. Emojis e outros símbolos mudam o sentido
+# ("ok 😡", "obrigado 🙄"), então mensagens com eles sempre vão para os modelos.
+CARACTERES_SIMPLES = re.compile(r"[\w\s.,;:!?'\"()\-]*")
+
 # --- PARTE 2: FUNÇÕES DE PROCESSAMENTO E CARREGAMENTO ---
 
 @st.cache_resource
@@ -77,16 +116,112 @@ def carregar_modelo_sentimento():
     print("Modelo de SENTIMENTO carregado com sucesso.")
     return analyzer
 
-def analisar_texto(emotion_analyzer, sentiment_analyzer, texto):
+def normalizar_para_regras(texto):
+    """
+    Minúsculas, sem acentos, sem pontuação e com espaços simples.
+    Retorna None se a mensagem tiver emojis ou outros símbolos.
+    """
+    texto = str(texto)
+    if not CARACTERES_SIMPLES.fullmatch(texto):
+        return None
+    texto_limpo = re.sub(r"[^a-z0-9\s]", " ", unidecode(texto.lower()))
+    return " ".join(texto_limpo.split())
+
+def aplicar_regras(texto):
+    """Retorna (nome_da_regra, emocao_en) da primeira regra que casa, ou None."""
+    texto_normalizado = normalizar_para_regras(texto)
+    if not texto_normalizado:
+        return None
+    for nome, padrao, label_en in REGRAS_COMPILADAS:
+        if padrao.fullmatch(texto_normalizado):
+            return nome, label_en
+    return None
+
+def classificar_por_regras(texto, regras_ativas):
+    """
+    Tenta resolver a mensagem só com o léxico/regex.
+    'regras_ativas' mapeia nome da regra -> confiança medida (ver 'calibrar_pre_classificador').
+    Retorna o mesmo dicionário de 'analisar_texto' ou None se nenhuma regra ativa casar.
+    """
+    casamento = aplicar_regras(texto)
+    if casamento is None or casamento[0] not in regras_ativas:
+        return None
+    nome, label_en = casamento
+    return {
+        "emocao_en": label_en,
+        "emocao_pt": traducao_emocoes.get(label_en, label_en),
+        "confianca": regras_ativas[nome],
+        "observacao": f"Pré-classificador: {nome}"
+    }
+
+def avaliar_pre_classificador(df, calibracao_anterior=None):
+    """
+    Compara cada regra com os rótulos dos modelos já gravados no dataset.
+    Linhas rotuladas pelas próprias regras não servem de medida; para que uma
+    re-análise não zere a medição, 'calibracao_anterior' ({regra: {"mensagens", "acertos"}})
+    é mantida sempre que tiver mais amostras do que a medição atual.
+    Retorna (resumo_por_regra, fracao_evitada, concordancia_geral); a fração
+    evitada e a concordância geral contam só as regras que ficam ativas.
+    """
+    # Resumo vazio com 'ativa' booleana, para que resumo[resumo["ativa"]] funcione sem dados
+    resumo_vazio = pd.DataFrame({
+        "regra": pd.Series(dtype=str),
+        "mensagens": pd.Series(dtype=int),
+        "acertos": pd.Series(dtype=int),
+        "concordancia": pd.Series(dtype=float),
+        "ativa": pd.Series(dtype=bool),
+    })
+
+    previstos = df["mensagem"].apply(aplicar_regras)
+    observacoes = df["observacao"].fillna("").astype(str)
+    medidos = previstos.notna() & ~observacoes.str.startswith("Pré-classificador")
+
+    df_avaliacao = pd.DataFrame({
+        "regra": previstos[medidos].str[0],
+        "acertou": previstos[medidos].str[1] == df.loc[medidos, "emocao_en"],
+    })
+    medicao = {
+        regra: {"mensagens": int(grupo.size), "acertos": int(grupo.sum())}
+        for regra, grupo in df_avaliacao.groupby("regra")["acertou"]
+    }
+    for regra, anterior in (calibracao_anterior or {}).items():
+        if anterior["mensagens"] > medicao.get(regra, {"mensagens": 0})["mensagens"]:
+            medicao[regra] = anterior
+    if not medicao:
+        return resumo_vazio, 0.0, 0.0
+
+    resumo = pd.DataFrame(
+        [{"regra": regra, **contagem} for regra, contagem in medicao.items()]
+    ).sort_values("mensagens", ascending=False)
+    resumo["concordancia"] = resumo["acertos"] / resumo["mensagens"]
+    resumo["ativa"] = (
+        (resumo["mensagens"] >= AMOSTRAS_MINIMAS_REGRA)
+        & (resumo["concordancia"] >= CONCORDANCIA_MINIMA_REGRA)
+    ).astype(bool)
+
+    # Fração evitada: mensagens do dataset (inclusive as já rotuladas por regras) que uma regra ativa resolve
+    ativas = resumo.loc[resumo["ativa"]]
+    fracao_evitada = previstos.str[0].isin(ativas["regra"]).mean() if len(df) else 0.0
+    concordancia = ativas["acertos"].sum() / ativas["mensagens"].sum() if len(ativas) else 0.0
+    return resumo, fracao_evitada, concordancia
+
+def analisar_texto(emotion_analyzer, sentiment_analyzer, texto, regras_ativas=None):
     """
     Recebe um texto e retorna um dicionário com a análise de emoção,
     validada pela análise de sentimento.
     Versão robusta que assume 'neutro' em caso de falha ou ausência de emoção.
+    Com 'regras_ativas', mensagens triviais são resolvidas antes dos modelos.
     """
     texto_padronizado = texto.strip().lower()
     if not texto_padronizado: 
         return None
 
+    # --- Passo 0: Pré-classificador por regras (evita os modelos) ---
+    if regras_ativas:
+        resultado_regras = classificar_por_regras(texto_padronizado, regras_ativas)
+        if resultado_regras:
+            return resultado_regras
+
     # --- Passo 1: Analisar Emoção (com fallback) ---
     
     # MODIFICADO: Começamos assumindo 'neutro'
@@ -135,19 +270,75 @@ def analisar_texto(emotion_analyzer, sentiment_analyzer, texto):
         "observacao": None # (ou a observação de contradição, se houver)
     }
 
+### NOVO: Checkpoint do processamento em lote (permite retomar após falhas) ###
+def carregar_checkpoint():
+    """
+    Retorna (df_checkpoint, progresso) de um lote interrompido, ou (None, None).
+    Linhas de arquivos que não chegaram ao marcador de progresso são descartadas.
+    """
+    if not os.path.exists(ARQUIVO_CHECKPOINT_PROGRESSO):
+        return None, None
+    try:
+        with open(ARQUIVO_CHECKPOINT_PROGRESSO, "r", encoding="utf-8") as f:
+            progresso = json.load(f)
+        if os.path.exists(ARQUIVO_CHECKPOINT):
+            df_gravado = pd.read_csv(ARQUIVO_CHECKPOINT)
+            df_checkpoint = df_gravado[df_gravado["arquivo"].isin(progresso["arquivos_concluidos"])]
+            if len(df_checkpoint) < len(df_gravado):
+                # Regrava sem as sobras, para não duplicar linhas quando o arquivo for refeito
+                df_checkpoint.to_csv(ARQUIVO_CHECKPOINT, index=False, encoding="utf-8")
+        else:
+            df_checkpoint = pd.DataFrame()
+    except Exception as e:
+        st.warning(f"Checkpoint inválido, ignorando: {e}")
+        limpar_checkpoint()
+        return None, None
+    return df_checkpoint, progresso
+
+def salvar_checkpoint(resultados_lote, arquivos_lote, progresso):
+    """
+    Anexa os resultados ao CSV de checkpoint e, só depois, atualiza o marcador
+    de progresso. Se o app cair no meio, o marcador nunca aponta para dados
+    que não foram gravados.
+    """
+    if resultados_lote:
+        pd.DataFrame(resultados_lote).to_csv(
+            ARQUIVO_CHECKPOINT, mode="a", index=False, encoding="utf-8",
+            header=not os.path.exists(ARQUIVO_CHECKPOINT)
+        )
+
+    progresso["arquivos_concluidos"].extend(arquivos_lote)
+    arquivo_tmp = ARQUIVO_CHECKPOINT_PROGRESSO + ".tmp"
+    with open(arquivo_tmp, "w", encoding="utf-8") as f:
+        json.dump(progresso, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(arquivo_tmp, ARQUIVO_CHECKPOINT_PROGRESSO)
+
+def limpar_checkpoint():
+    for arquivo in (ARQUIVO_CHECKPOINT, ARQUIVO_CHECKPOINT_PROGRESSO):
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+
 ### MODIFICADO: Função 'processar_arquivos_json' agora extrai o id_serviço ###
-def processar_arquivos_json(analyzer_emotion, analyzer_sentiment, arquivos_para_processar):
+def processar_arquivos_json(analyzer_emotion, analyzer_sentiment, arquivos_para_processar, progresso):
     """
     Processa UMA LISTA ESPECÍFICA de arquivos JSON.
+    Os resultados não ficam em memória: são gravados no checkpoint a cada
+    CHECKPOINT_A_CADA_N_ARQUIVOS arquivos (leia-os com 'carregar_checkpoint').
     """
-    resultados = []
+    resultados_lote = []
+    arquivos_lote = []
     
     if not arquivos_para_processar:
-        return []
+        return
+
+    regras_ativas = obter_regras_ativas()
 
     progress_bar = st.progress(0, "Processando arquivos de atendimento...")
     for i, arquivo in enumerate(arquivos_para_processar):
         caminho = os.path.join(PASTA_JSON, arquivo)
+        resultados_arquivo = []
         try:
             with open(caminho, "r", encoding="utf-8") as f:
                 dados = json.load(f)
@@ -157,9 +348,9 @@ def processar_arquivos_json(analyzer_emotion, analyzer_sentiment, arquivos_para_
                 if entrada.get("autor") == "cliente":
                     texto = entrada.get("mensagem", "").strip()
                     if texto:
-                        resultado_analise = analisar_texto(analyzer_emotion, analyzer_sentiment, texto)
+                        resultado_analise = analisar_texto(analyzer_emotion, analyzer_sentiment, texto, regras_ativas)
                         if resultado_analise:
-                            resultados.append({
+                            resultados_arquivo.append({
                                 "arquivo": arquivo,
                                 "id_cliente": entrada.get("id_cliente"),
                                 "id_funcionario": entrada.get("id_funcionario"),
@@ -170,15 +361,22 @@ def processar_arquivos_json(analyzer_emotion, analyzer_sentiment, arquivos_para_
                                 "data": entrada.get("data"),
                                 "hora": entrada.get("hora")
                             })
+            # Só arquivos lidos por completo entram no checkpoint
+            resultados_lote.extend(resultados_arquivo)
+            arquivos_lote.append(arquivo)
         except Exception as e:
             st.error(f"Erro ao processar o arquivo '{arquivo}': {e}")
+
+        ultimo_arquivo = i + 1 == len(arquivos_para_processar)
+        if len(arquivos_lote) >= CHECKPOINT_A_CADA_N_ARQUIVOS or ultimo_arquivo:
+            salvar_checkpoint(resultados_lote, arquivos_lote, progresso)
+            resultados_lote, arquivos_lote = [], []
         
         # Atualiza a barra de progresso
         progresso_atual = (i + 1) / len(arquivos_para_processar)
         progress_bar.progress(progresso_atual, f"Processando: {arquivo}")
     
     progress_bar.empty()
-    return resultados
 
 ### MODIFICADO: 'carregar_dados_csv' agora inclui 'id_serviço' ###
 def carregar_dados_csv():
@@ -203,10 +401,325 @@ def carregar_dados_csv():
     return df
 
 def salvar_dados_csv(df):
+    # Grava num temporário e troca de uma vez: outras sessões leem o CSV a cada execução
+    # e nunca devem ver um arquivo pela metade (nem uma queda pode truncá-lo)
+    arquivo_tmp = ARQUIVO_CSV_SAIDA + ".tmp"
     try:
-        df.to_csv(ARQUIVO_CSV_SAIDA, index=False, encoding="utf-8-sig")
+        df.to_csv(arquivo_tmp, index=False, encoding="utf-8-sig")
+        os.replace(arquivo_tmp, ARQUIVO_CSV_SAIDA)
+        return True
     except Exception as e:
         st.error(f"Falha ao salvar o arquivo CSV: {e}")
+        return False
+
+
+### NOVO: Armazenamento de embeddings e busca de mensagens semelhantes ###
+@st.cache_resource
+def carregar_modelo_embeddings():
+    print("Carregando modelo de EMBEDDINGS de frases...")
+    modelo = SentenceTransformer(MODELO_EMBEDDINGS)
+    print("Modelo de EMBEDDINGS carregado com sucesso.")
+    return modelo
+
+def chave_mensagem(texto):
+    """Hash estável (int64) do texto padronizado, usado para reaproveitar embeddings."""
+    texto_padronizado = str(texto).strip().lower().encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(texto_padronizado, digest_size=8).digest(), "little", signed=True)
+
+def gerar_embeddings(textos):
+    modelo = carregar_modelo_embeddings()
+    vetores = modelo.encode(
+        [str(t).strip().lower() for t in textos],
+        batch_size=64,
+        normalize_embeddings=True, # Vetores unitários: produto escalar = similaridade de cosseno
+        show_progress_bar=False
+    )
+    return np.asarray(vetores, dtype=np.float32)
+
+def sincronizar_embeddings(df):
+    """
+    Garante que o arquivo de embeddings esteja alinhado às linhas do DataFrame
+    (mesma ordem do CSV). Vetores já calculados são reaproveitados pela chave da
+    mensagem; o modelo só roda para as mensagens novas.
+    """
+    mensagens = df["mensagem"].fillna("").astype(str)
+    chaves = np.fromiter((chave_mensagem(m) for m in mensagens), dtype=np.int64, count=len(mensagens))
+
+    chaves_antigas = np.empty(0, dtype=np.int64)
+    vetores_antigos = None
+    if os.path.exists(ARQUIVO_EMBEDDINGS) and os.path.exists(ARQUIVO_EMBEDDINGS_CHAVES):
+        chaves_antigas = np.load(ARQUIVO_EMBEDDINGS_CHAVES)
+        vetores_antigos = np.load(ARQUIVO_EMBEDDINGS, mmap_mode="r")
+        if len(chaves_antigas) != len(vetores_antigos):
+            # Store inconsistente (ex.: queda no meio de uma gravação): recalcula tudo
+            chaves_antigas = np.empty(0, dtype=np.int64)
+            vetores_antigos = None
+        elif np.array_equal(chaves_antigas, chaves):
+            return # Já está sincronizado, nada a fazer
+
+    # Procura cada chave no arquivo antigo (busca binária vetorizada)
+    if len(chaves_antigas):
+        ordem = np.argsort(chaves_antigas)
+        pos = np.searchsorted(chaves_antigas, chaves, sorter=ordem)
+        origem = ordem[np.minimum(pos, len(ordem) - 1)]
+        encontrados = chaves_antigas[origem] == chaves
+    else:
+        origem = np.zeros(len(chaves), dtype=np.int64)
+        encontrados = np.zeros(len(chaves), dtype=bool)
+
+    faltantes = np.flatnonzero(~encontrados)
+    novos = gerar_embeddings(mensagens.iloc[faltantes]) if len(faltantes) else None
+    if novos is None and vetores_antigos is None:
+        return # DataFrame vazio e nenhum store anterior
+    dim = novos.shape[1] if novos is not None else vetores_antigos.shape[1]
+
+    # Escreve em arquivos temporários e troca no final, para nunca deixar o store pela metade
+    arquivo_tmp = ARQUIVO_EMBEDDINGS + ".tmp"
+    vetores = np.lib.format.open_memmap(arquivo_tmp, mode="w+", dtype=np.float32, shape=(len(chaves), dim))
+    if encontrados.any():
+        vetores[encontrados] = vetores_antigos[origem[encontrados]]
+    if novos is not None:
+        vetores[faltantes] = novos
+    vetores.flush()
+    del vetores, vetores_antigos
+
+    arquivo_chaves_tmp = ARQUIVO_EMBEDDINGS_CHAVES + ".tmp"
+    with open(arquivo_chaves_tmp, "wb") as f:
+        np.save(f, chaves)
+
+    # O índice em cache mantém o arquivo antigo mapeado (no Windows isso impede a troca)
+    construir_indice_similaridade.clear()
+
+    # Remove as chaves antes de trocar os vetores: se o app cair entre as duas trocas,
+    # o store fica sem chaves e é recalculado, em vez de parear chaves e vetores errados
+    if os.path.exists(ARQUIVO_EMBEDDINGS_CHAVES):
+        os.remove(ARQUIVO_EMBEDDINGS_CHAVES)
+    os.replace(arquivo_tmp, ARQUIVO_EMBEDDINGS)
+    os.replace(arquivo_chaves_tmp, ARQUIVO_EMBEDDINGS_CHAVES)
+
+def tentar_sincronizar_embeddings(df):
+    """
+    Sincroniza os embeddings sem derrubar o app: se o modelo não baixar/carregar,
+    o dataset continua utilizável e só a busca de semelhantes fica sem os dados novos.
+    """
+    try:
+        sincronizar_embeddings(df)
+        return True
+    except Exception as e:
+        print(f"Erro ao sincronizar embeddings: {e}")
+        st.warning(f"Não foi possível atualizar os embeddings das mensagens: {e}")
+        return False
+
+def agrupar_kmeans(vetores, n_grupos, iteracoes=15, semente=42):
+    """K-means esférico (cosseno) em NumPy puro. Retorna (centroides, rotulos)."""
+    vetores = np.asarray(vetores, dtype=np.float32)
+    n_grupos = max(1, min(n_grupos, len(vetores)))
+    rng = np.random.default_rng(semente)
+    centroides = vetores[rng.choice(len(vetores), n_grupos, replace=False)].copy()
+    colunas = np.arange(len(vetores))
+
+    for _ in range(iteracoes):
+        rotulos = np.argmax(vetores @ centroides.T, axis=1)
+        # Soma por grupo via matriz one-hot (BLAS), bem mais rápida que np.add.at
+        onehot = np.zeros((n_grupos, len(vetores)), dtype=np.float32)
+        onehot[rotulos, colunas] = 1.0
+        somas = onehot @ vetores
+        normas = np.linalg.norm(somas, axis=1, keepdims=True)
+        # Grupos que ficaram vazios mantêm o centroide anterior
+        centroides = np.where(normas > 0, somas / np.maximum(normas, 1e-12), centroides)
+
+    rotulos = np.argmax(vetores @ centroides.T, axis=1)
+    return centroides, rotulos
+
+@st.cache_resource(max_entries=1)
+def construir_indice_similaridade(versao):
+    """
+    Monta o índice de vizinhos mais próximos sobre o store de embeddings.
+    'versao' (data de modificação do arquivo) invalida o cache quando o store muda.
+    Acima de IVF_MIN_MENSAGENS o índice é particionado em listas (estilo IVF).
+    """
+    vetores = np.load(ARQUIVO_EMBEDDINGS, mmap_mode="r")
+    chaves = np.load(ARQUIVO_EMBEDDINGS_CHAVES)
+
+    centroides, rotulos = None, None
+    if len(vetores) >= IVF_MIN_MENSAGENS:
+        # Centroides treinados numa amostra; depois cada linha vai para a lista mais próxima
+        rng = np.random.default_rng(42)
+        amostra = np.sort(rng.choice(len(vetores), min(len(vetores), IVF_AMOSTRA_TREINO), replace=False))
+        centroides, _ = agrupar_kmeans(vetores[amostra], int(np.sqrt(len(vetores))))
+        rotulos = np.argmax(vetores @ centroides.T, axis=1)
+
+    return {
+        "vetores": vetores,
+        "chaves": chaves,
+        "ordem_chaves": np.argsort(chaves),
+        "centroides": centroides,
+        "rotulos": rotulos,
+    }
+
+@st.cache_data(max_entries=20)
+def agrupar_mensagens_filtradas(versao, linhas_filtro, n_grupos):
+    """
+    Agrupa as mensagens do filtro atual; em cache por (versão do índice, linhas, n_grupos),
+    para que buscas e outros widgets não refaçam o k-means a cada execução.
+    Retorna (rotulos, proximidade ao centroide do próprio grupo, n_grupos).
+    """
+    vetores = np.asarray(construir_indice_similaridade(versao)["vetores"][linhas_filtro])
+    centroides, rotulos = agrupar_kmeans(vetores, n_grupos)
+    proximidade = np.einsum("ij,ij->i", vetores, centroides[rotulos])
+    return rotulos, proximidade, len(centroides)
+
+def linhas_no_indice(indice, df):
+    """Converte as linhas de um DataFrame nas linhas correspondentes do store (-1 se ausente)."""
+    chaves = np.fromiter(
+        (chave_mensagem(m) for m in df["mensagem"].fillna("").astype(str)),
+        dtype=np.int64, count=len(df)
+    )
+    if not len(indice["chaves"]):
+        return np.full(len(chaves), -1, dtype=np.int64)
+    ordem = indice["ordem_chaves"]
+    pos = np.searchsorted(indice["chaves"], chaves, sorter=ordem)
+    linhas = ordem[np.minimum(pos, len(ordem) - 1)]
+    return np.where(indice["chaves"][linhas] == chaves, linhas, -1)
+
+def buscar_semelhantes(indice, vetor_consulta, k=10, linhas_permitidas=None):
+    """
+    Retorna (linhas, similaridades) das k mensagens mais próximas da consulta,
+    opcionalmente restritas a 'linhas_permitidas' (ex.: o filtro atual).
+    Com filtro a busca é exata sobre as linhas permitidas; o IVF só é usado
+    em consultas sem filtro, onde não corre o risco de descartar vizinhos.
+    """
+    vetores = indice["vetores"]
+    if linhas_permitidas is not None:
+        candidatos = np.asarray(linhas_permitidas, dtype=np.int64)
+    elif indice["centroides"] is not None:
+        listas = np.argsort(-(indice["centroides"] @ vetor_consulta))[:IVF_NPROBE]
+        candidatos = np.flatnonzero(np.isin(indice["rotulos"], listas))
+        if len(candidatos) < k:
+            candidatos = np.arange(len(vetores)) # Listas visitadas pequenas demais: busca exata
+    else:
+        candidatos = np.arange(len(vetores))
+
+    if not len(candidatos):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    similaridades = vetores[candidatos] @ vetor_consulta
+    k = min(k, len(candidatos))
+    top = np.argpartition(-similaridades, k - 1)[:k]
+    top = top[np.argsort(-similaridades[top])]
+    return candidatos[top], similaridades[top]
+
+### NOVO: Filtro de período e reamostragem das séries temporais ###
+def filtrar_por_periodo(df, data_inicio, data_fim):
+    """Mantém só as linhas com 'data' dentro do intervalo (inclusivo)."""
+    datas = pd.to_datetime(df["data"], errors="coerce")
+    return df[datas.between(pd.Timestamp(data_inicio), pd.Timestamp(data_fim))]
+
+def reamostrar_serie(df, coluna_valor, granularidade="Automática"):
+    """
+    Calcula a média de 'coluna_valor' por período a partir das linhas individuais.
+    Na granularidade 'Automática' escolhe a menor (dia, semana ou mês) que
+    caiba em MAX_PONTOS_GRAFICO pontos, para o gráfico continuar leve com anos de dados.
+    """
+    df_serie = df.assign(data=pd.to_datetime(df["data"], errors="coerce")).dropna(subset=["data"])
+    if df_serie.empty:
+        return pd.DataFrame(columns=["data", coluna_valor]), "D"
+
+    if granularidade in GRANULARIDADES:
+        freq = GRANULARIDADES[granularidade]
+    else:
+        dias = (df_serie["data"].max() - df_serie["data"].min()).days + 1
+        if dias <= MAX_PONTOS_GRAFICO:
+            freq = "D"
+        elif dias / 7 <= MAX_PONTOS_GRAFICO:
+            freq = "W"
+        else:
+            freq = "MS"
+
+    serie = (
+        df_serie.groupby(pd.Grouper(key="data", freq=freq))[coluna_valor]
+        .mean()
+        .dropna() # Períodos sem mensagens não viram pontos
+        .reset_index()
+    )
+    return serie, freq
+
+### NOVO: Dataset compartilhado entre sessões (somente leitura) ###
+def versao_dataset():
+    """Identifica a versão do CSV gravado; muda a cada gravação."""
+    try:
+        info = os.stat(ARQUIVO_CSV_SAIDA)
+        return (info.st_mtime_ns, info.st_size)
+    except FileNotFoundError:
+        return None
+
+@st.cache_resource(max_entries=1)
+def carregar_dataset_compartilhado(versao):
+    """
+    Carrega o CSV uma vez por versão para TODAS as sessões do processo.
+    O DataFrame é compartilhado: nunca altere-o no lugar, sempre gere um novo
+    (filtro, concat, copy). max_entries=1 libera a versão anterior ao recarregar.
+    """
+    df = carregar_dados_csv()
+    if not df.empty:
+        # Limpeza feita uma única vez aqui, e não a cada execução do dashboard
+        df = df.dropna(subset=["id_funcionario"])
+        df["id_funcionario"] = df["id_funcionario"].astype(str)
+        tentar_sincronizar_embeddings(df) # Calcula embeddings de dados antigos, se faltarem
+    return df
+
+def obter_dataset():
+    return carregar_dataset_compartilhado(versao_dataset())
+
+@st.cache_resource
+def obter_trava_dataset():
+    """Serializa as gravações no CSV feitas por sessões diferentes."""
+    return threading.Lock()
+
+@st.cache_resource
+def obter_trava_lote():
+    """Garante um único processamento em lote por vez (o checkpoint é compartilhado)."""
+    return threading.Lock()
+
+def carregar_calibracao_regras():
+    try:
+        with open(ARQUIVO_CALIBRACAO_REGRAS, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def salvar_calibracao_regras(resumo):
+    calibracao = {
+        linha.regra: {"mensagens": int(linha.mensagens), "acertos": int(linha.acertos)}
+        for linha in resumo.itertuples()
+    }
+    arquivo_tmp = ARQUIVO_CALIBRACAO_REGRAS + ".tmp"
+    with open(arquivo_tmp, "w", encoding="utf-8") as f:
+        json.dump(calibracao, f, ensure_ascii=False)
+    os.replace(arquivo_tmp, ARQUIVO_CALIBRACAO_REGRAS)
+
+@st.cache_resource(max_entries=1)
+def calibrar_pre_classificador(versao):
+    """
+    Avalia as regras uma única vez por versão do dataset (ver 'avaliar_pre_classificador').
+    A medição fica congelada em ARQUIVO_CALIBRACAO_REGRAS, para que as mensagens
+    que a cascata passa a rotular não desliguem a própria regra na re-análise seguinte.
+    """
+    calibracao_anterior = carregar_calibracao_regras()
+    resultado = avaliar_pre_classificador(carregar_dataset_compartilhado(versao), calibracao_anterior)
+    if not resultado[0].empty:
+        salvar_calibracao_regras(resultado[0])
+    return resultado
+
+def obter_regras_ativas():
+    """Regras que entram na cascata, com a concordância medida como confiança."""
+    if not USAR_PRE_CLASSIFICADOR:
+        return {}
+    resumo, _, _ = calibrar_pre_classificador(versao_dataset())
+    if resumo.empty:
+        return {} # Instalação nova ou nenhuma mensagem trivial medida ainda
+    ativas = resumo.loc[resumo["ativa"].astype(bool)]
+    return {regra: round(float(conc), 4) for regra, conc in zip(ativas["regra"], ativas["concordancia"])}
 
 
 # --- PARTE 3: INICIALIZAÇÃO DA APLICAÇÃO STREAMLIT ---
@@ -214,8 +727,8 @@ def salvar_dados_csv(df):
 st.set_page_config(page_title="Análise de Emoções em Atendimentos", layout="wide")
 analyzer_emotion = carregar_modelo_emocao()
 analyzer_sentiment = carregar_modelo_sentimento()
-if 'df' not in st.session_state:
-    st.session_state.df = carregar_dados_csv()
+# Snapshot compartilhado; a sessão guarda apenas o estado dos filtros
+df_base = obter_dataset()
 st.title("📊 Análise de sentimentos da empresa jcsi. Feita por Maria Analyzer")
 
 
@@ -228,8 +741,8 @@ st.sidebar.caption("Adiciona uma *única mensagem de cliente* ao sistema.")
 with st.sidebar.form("novo_atendimento_form", clear_on_submit=True):
     # Pega funcionários existentes para o selectbox
     funcionarios_existentes = ["-"] # Default
-    if 'df' in st.session_state and not st.session_state.df.empty:
-         funcionarios_existentes = list(st.session_state.df["id_funcionario"].unique())
+    if not df_base.empty:
+         funcionarios_existentes = list(df_base["id_funcionario"].unique())
          
     novo_id_funcionario = st.selectbox("ID do Funcionário*", options=funcionarios_existentes)
     novo_id_cliente = st.text_input("ID do Cliente*")
@@ -250,7 +763,8 @@ if submit_button:
             resultado_analise = analisar_texto(
                 analyzer_emotion, 
                 analyzer_sentiment, 
-                nova_mensagem
+                nova_mensagem,
+                regras_ativas=obter_regras_ativas()
             )
             
             if resultado_analise:
@@ -269,9 +783,11 @@ if submit_button:
                 }
                 
                 df_novo_registro = pd.DataFrame([novo_registro])
-                st.session_state.df = pd.concat([st.session_state.df, df_novo_registro], ignore_index=True)
-                
-                salvar_dados_csv(st.session_state.df)
+                # Relê a versão mais recente dentro da trava para não perder gravações de outras sessões
+                with obter_trava_dataset():
+                    df_atualizado = pd.concat([obter_dataset(), df_novo_registro], ignore_index=True)
+                    salvar_dados_csv(df_atualizado)
+                    tentar_sincronizar_embeddings(df_atualizado)
                 
                 st.sidebar.success("Atendimento adicionado com sucesso!")
                 st.rerun() 
@@ -285,80 +801,141 @@ st.sidebar.header("🔄 Processamento em Lote")
 st.sidebar.write("Busca por arquivos .json na pasta `atendimento/`.")
 force_reanalysis = st.sidebar.checkbox("Forçar re-análise de TODOS os arquivos")
 st.sidebar.caption("Marque esta caixa se você atualizou a lógica de análise e quer corrigir os dados antigos.")
+trava_lote = obter_trava_lote()
+if trava_lote.locked():
+    st.sidebar.info("Um processamento em lote está em andamento em outra sessão.")
+elif os.path.exists(ARQUIVO_CHECKPOINT_PROGRESSO):
+    st.sidebar.warning("Há um processamento em lote interrompido. Clique em 'Iniciar' para retomá-lo sem refazer o que já foi analisado.")
 
 if st.sidebar.button("Iniciar Processamento em Lote"):
-    
-    if not os.path.isdir(PASTA_JSON):
-        st.error(f"ERRO: A pasta '{PASTA_JSON}' não foi encontrada.")
+    # Um lote por vez no processo: duas sessões no mesmo checkpoint duplicariam linhas
+    if not trava_lote.acquire(blocking=False):
+        st.sidebar.warning("Já existe um processamento em lote em andamento em outra sessão. Aguarde ele terminar.")
         st.stop()
+    try:
+        if not os.path.isdir(PASTA_JSON):
+            st.error(f"ERRO: A pasta '{PASTA_JSON}' não foi encontrada.")
+            st.stop()
         
-    todos_arquivos_na_pasta = [f for f in os.listdir(PASTA_JSON) if f.endswith(".json")]
-    if not todos_arquivos_na_pasta:
-        st.info("Nenhum arquivo .json encontrado na pasta 'atendimento/'.")
-        st.stop()
-
-    arquivos_para_processar = []
-    df_antigo = st.session_state.df.copy() 
-
-    if force_reanalysis:
-        st.sidebar.warning("Forçando re-análise de todos os arquivos...")
-        arquivos_para_processar = todos_arquivos_na_pasta
-        # Limpa o DataFrame antigo (apenas as linhas vindas de JSONs) para que seja substituído
-        # Mantém os adicionados via app
-        df_antigo = df_antigo[df_antigo['arquivo'] == 'adicionado_via_app'] 
+        todos_arquivos_na_pasta = [f for f in os.listdir(PASTA_JSON) if f.endswith(".json")]
+        if not todos_arquivos_na_pasta:
+            st.info("Nenhum arquivo .json encontrado na pasta 'atendimento/'.")
+            st.stop()
+
+        # Se um lote anterior foi interrompido, retoma de onde parou (no mesmo modo)
+        _, progresso = carregar_checkpoint()
+        if progresso is not None:
+            force_reanalysis = progresso["forcar_reanalise"]
+            st.sidebar.info(f"Retomando lote interrompido: {len(progresso['arquivos_concluidos'])} arquivo(s) já analisado(s).")
+        else:
+            progresso = {"forcar_reanalise": force_reanalysis, "arquivos_concluidos": []}
+
+        arquivos_para_processar = []
+
+        if force_reanalysis:
+            st.sidebar.warning("Forçando re-análise de todos os arquivos...")
+            arquivos_para_processar = todos_arquivos_na_pasta
         
-    else:
-        # Lógica Normal: Processar apenas os novos
-        arquivos_processados = set(df_antigo['arquivo'].unique())
-        arquivos_para_processar = [f for f in todos_arquivos_na_pasta if f not in arquivos_processados]
+        else:
+            # Lógica Normal: Processar apenas os novos
+            arquivos_processados = set(df_base['arquivo'].unique())
+            arquivos_para_processar = [f for f in todos_arquivos_na_pasta if f not in arquivos_processados]
 
-    if not arquivos_para_processar:
-        st.info("Nenhum arquivo NOVO para processar.")
-        st.stop()
+        concluidos = set(progresso["arquivos_concluidos"])
+        arquivos_para_processar = [f for f in arquivos_para_processar if f not in concluidos]
+
+        if not arquivos_para_processar and not concluidos:
+            st.info("Nenhum arquivo NOVO para processar.")
+            st.stop()
     
-    st.sidebar.info(f"Processando {len(arquivos_para_processar)} arquivo(s)...")
+        st.sidebar.info(f"Processando {len(arquivos_para_processar)} arquivo(s)...")
     
-    novos_resultados = processar_arquivos_json(
-        analyzer_emotion, 
-        analyzer_sentiment,
-        arquivos_para_processar
-    )
+        processar_arquivos_json(
+            analyzer_emotion, 
+            analyzer_sentiment,
+            arquivos_para_processar,
+            progresso=progresso
+        )
     
-    if novos_resultados:
-        df_novos = pd.DataFrame(novos_resultados)
-        st.session_state.df = pd.concat([df_antigo, df_novos], ignore_index=True)
-        salvar_dados_csv(st.session_state.df)
-        st.success(f"Sucesso! {len(df_novos)} registros foram processados e adicionados.")
-        st.rerun()
-    else:
-        st.info("Processamento concluído, mas nenhum dado de cliente foi extraído dos novos arquivos.")
+        # O checkpoint contém tanto o que foi retomado quanto o que acabou de ser analisado
+        df_novos, _ = carregar_checkpoint()
+        if df_novos is not None and not df_novos.empty:
+            with obter_trava_dataset():
+                # Versão mais recente: outras sessões podem ter gravado durante o lote
+                df_antigo = obter_dataset()
+                if force_reanalysis:
+                    # Limpa o DataFrame antigo (apenas as linhas vindas de JSONs) para que seja substituído
+                    # Mantém os adicionados via app
+                    df_antigo = df_antigo[df_antigo['arquivo'] == 'adicionado_via_app']
+                else:
+                    # Se o app caiu depois de gravar o CSV e antes de limpar o checkpoint,
+                    # esses arquivos já estão no dataset: não os adiciona de novo
+                    df_novos = df_novos[~df_novos['arquivo'].isin(df_antigo['arquivo'])]
+                if df_novos.empty:
+                    limpar_checkpoint()
+                else:
+                    df_atualizado = pd.concat([df_antigo, df_novos], ignore_index=True)
+                    if salvar_dados_csv(df_atualizado):
+                        limpar_checkpoint() # Só descarta o checkpoint depois que o CSV final foi gravado
+                    with st.spinner("Gerando embeddings das novas mensagens..."):
+                        tentar_sincronizar_embeddings(df_atualizado)
+            st.success(f"Sucesso! {len(df_novos)} registros foram processados e adicionados.")
+            st.rerun()
+        else:
+            limpar_checkpoint()
+            st.info("Processamento concluído, mas nenhum dado de cliente foi extraído dos novos arquivos.")
+    finally:
+        trava_lote.release()
 
 
 st.sidebar.divider()
 
 # --- PARTE 5: DASHBOARD ---
 st.sidebar.header("🔍 Filtro por Funcionário")
-if st.session_state.df.empty:
+if df_base.empty:
     st.sidebar.warning("Nenhum dado para filtrar.")
     funcionarios_selecionados = []
 else:
-    st.session_state.df = st.session_state.df.dropna(subset=["id_funcionario"])
-    st.session_state.df["id_funcionario"] = st.session_state.df["id_funcionario"].astype(str)
-    opcoes_funcionarios = sorted(st.session_state.df["id_funcionario"].unique())
+    opcoes_funcionarios = sorted(df_base["id_funcionario"].unique())
     funcionarios_selecionados = st.sidebar.multiselect(
         "Selecione o(s) funcionário(s):",
         options=opcoes_funcionarios,
         default=opcoes_funcionarios
     )
 
+### NOVO: Filtro por período (aplicado antes de qualquer agregação) ###
+st.sidebar.header("📅 Filtro por Período")
+periodo = None
+granularidade = "Automática"
+datas_validas = pd.to_datetime(df_base["data"], errors="coerce").dropna()
+if datas_validas.empty:
+    st.sidebar.caption("Nenhuma data válida para filtrar.")
+else:
+    data_min, data_max = datas_validas.min().date(), datas_validas.max().date()
+    periodo = st.sidebar.date_input(
+        "Selecione o período:",
+        value=(data_min, data_max),
+        min_value=data_min,
+        max_value=data_max,
+        format="DD/MM/YYYY"
+    )
+    granularidade = st.sidebar.selectbox(
+        "Agrupar gráficos por data:",
+        ["Automática"] + list(GRANULARIDADES.keys())
+    )
+
 # ... (código do df_filtrado) ...
-if not funcionarios_selecionados and not st.session_state.df.empty:
+if not funcionarios_selecionados and not df_base.empty:
     st.warning("Por favor, selecione pelo menos um funcionário no filtro.")
-    df_filtrado = pd.DataFrame(columns=st.session_state.df.columns)
-elif st.session_state.df.empty:
-     df_filtrado = st.session_state.df.copy()
+    df_filtrado = pd.DataFrame(columns=df_base.columns)
+elif df_base.empty:
+     df_filtrado = df_base.copy()
 else:
-    df_filtrado = st.session_state.df[st.session_state.df["id_funcionario"].isin(funcionarios_selecionados)]
+    df_filtrado = df_base[df_base["id_funcionario"].isin(funcionarios_selecionados)]
+
+# O date_input devolve só a data inicial enquanto o usuário escolhe o intervalo
+if periodo and len(periodo) == 2 and tuple(periodo) != (data_min, data_max):
+    df_filtrado = filtrar_por_periodo(df_filtrado, *periodo)
 
 st.markdown("---")
 
@@ -587,20 +1164,14 @@ else:
     # Aplica polaridade
     df_data["polaridade"] = df_data["emocao_pt"].apply(polaridade)
 
-    # Garante que a coluna 'data' está em datetime
-    df_data["data"] = pd.to_datetime(df_data["data"], errors="coerce")
-
-    # Remove datas inválidas
-    df_data = df_data.dropna(subset=["data"])
-
-    # Agrupa por data e calcula média da polaridade
-    media_por_data = df_data.groupby("data")["polaridade"].mean().reset_index()
+    # Média da polaridade por dia/semana/mês (ignora datas inválidas)
+    media_por_data, freq_data = reamostrar_serie(df_data, "polaridade", granularidade)
 
     # Plota gráfico de linha
     fig, ax = plt.subplots(figsize=(12,5))
     ax.plot(media_por_data["data"], media_por_data["polaridade"], marker="o", color="#348e91", linewidth=2)
     ax.axhline(0, color="gray", linestyle="--", linewidth=1)
-    ax.set_xlabel("Data")
+    ax.set_xlabel(f"Data (média por {NOMES_FREQUENCIAS[freq_data]})")
     ax.set_ylabel("Satisfação (média)")
     ax.tick_params(axis='x', rotation=45)
 
@@ -608,15 +1179,13 @@ else:
     st.markdown("---")
 
     st.subheader("📈 Confiança da Emoção ao Longo do Período")
-    df_temp = df_filtrado.copy()
     try:
-        df_temp['data'] = pd.to_datetime(df_temp['data'])
-        media_sentimento = df_temp.groupby('data')['confianca'].mean().reset_index()
+        media_sentimento, freq_confianca = reamostrar_serie(df_filtrado, 'confianca', granularidade)
         
         fig, ax = plt.subplots(figsize=(10,4))
         ax.plot(media_sentimento['data'], media_sentimento['confianca'], marker='o', color="#348e91")
         ax.set_ylabel("Confiança Média")
-        ax.set_xlabel("Data")
+        ax.set_xlabel(f"Data (média por {NOMES_FREQUENCIAS[freq_confianca]})")
         ax.tick_params(axis='x', rotation=45)
         st.pyplot(fig)
     except Exception as e:
@@ -761,5 +1330,78 @@ else:
     ax.set_ylabel("Termo")
     st.pyplot(fig)
 
+    ### NOVO: Avaliação do pré-classificador contra os rótulos dos modelos ###
+    st.markdown("---")
+    with st.expander("🧪 Avaliação do Pré-classificador por Regras"):
+        st.caption(
+            "Compara as regras com os rótulos dos modelos em TODO o dataset gravado (ignora o filtro). "
+            f"Só entram na cascata regras com ao menos {AMOSTRAS_MINIMAS_REGRA} mensagens "
+            f"e {CONCORDANCIA_MINIMA_REGRA:.0%} de concordância."
+        )
+        resumo_regras, fracao_evitada, concordancia = calibrar_pre_classificador(versao_dataset())
+        col_evitada, col_concordancia = st.columns(2)
+        col_evitada.metric("Inferência evitada", f"{fracao_evitada:.1%}")
+        col_concordancia.metric("Concordância com os modelos", f"{concordancia:.1%}")
+        st.dataframe(resumo_regras, hide_index=True, use_container_width=True)
+
+    ### NOVO: Mensagens semelhantes e grupos de problemas recorrentes ###
+    st.markdown("---")
+    st.subheader("🔎 Mensagens Semelhantes")
+
+    if not os.path.exists(ARQUIVO_EMBEDDINGS):
+        st.info("Embeddings indisponíveis: nenhum foi calculado ainda ou o modelo de embeddings não pôde ser carregado.")
+    else:
+        versao_indice = os.path.getmtime(ARQUIVO_EMBEDDINGS)
+        indice = construir_indice_similaridade(versao_indice)
+        linhas_df = linhas_no_indice(indice, df_filtrado)
+        linhas_filtro = np.unique(linhas_df[linhas_df >= 0])
+
+        # Uma linha do store pode representar várias mensagens idênticas no filtro
+        df_mensagens = df_filtrado[linhas_df >= 0].assign(linha_indice=linhas_df[linhas_df >= 0])
+        df_mensagens = df_mensagens.drop_duplicates("linha_indice").set_index("linha_indice")
+        if (linhas_df < 0).any():
+            st.caption(f"{(linhas_df < 0).sum()} mensagem(ns) do filtro ainda sem embedding (modelo indisponível na última gravação).")
+
+        consulta = st.text_input("Descreva o problema (ex.: \"pc não liga\"):")
+        vetor_consulta = None
+        if consulta.strip():
+            try:
+                vetor_consulta = gerar_embeddings([consulta])[0]
+            except Exception as e:
+                st.warning(f"Modelo de embeddings indisponível, não é possível buscar por texto: {e}")
+        if vetor_consulta is not None:
+            # Sem filtro ativo a busca pode usar o IVF; com filtro, é exata sobre as linhas do filtro
+            sem_filtro = len(df_filtrado) == len(df_base)
+            linhas, similaridades = buscar_semelhantes(
+                indice, vetor_consulta, k=10,
+                linhas_permitidas=None if sem_filtro else linhas_filtro
+            )
+            # Mensagens repetidas ocupam mais de uma linha do store; mostra só a representada no filtro
+            no_filtro = np.isin(linhas, df_mensagens.index)
+            linhas, similaridades = linhas[no_filtro], similaridades[no_filtro]
+            df_semelhantes = df_mensagens.loc[linhas, ["mensagem", "emocao_pt", "id_funcionario", "data"]]
+            df_semelhantes["similaridade"] = np.round(similaridades, 3)
+            st.dataframe(df_semelhantes, hide_index=True, use_container_width=True)
+
+        st.subheader("🧩 Grupos de Problemas Recorrentes")
+        if len(linhas_filtro) < 2:
+            st.info("Mensagens insuficientes no filtro atual para formar grupos.")
+        else:
+            n_grupos = st.slider("Quantidade de grupos", 2, min(20, len(linhas_filtro)), min(8, len(linhas_filtro)))
+            rotulos, proximidade, n_grupos = agrupar_mensagens_filtradas(versao_indice, linhas_filtro, n_grupos)
+
+            for g in np.argsort(-np.bincount(rotulos, minlength=n_grupos)):
+                membros = np.flatnonzero(rotulos == g)
+                if not len(membros):
+                    continue
+                # As mensagens mais próximas do centroide representam o grupo
+                representantes = linhas_filtro[membros[np.argsort(-proximidade[membros])[:5]]]
+                df_grupo = df_mensagens.loc[linhas_filtro[membros]]
+                emocao_dominante = df_grupo["emocao_pt"].mode().iat[0]
+
+                with st.expander(f"Grupo {g + 1}: {len(membros)} mensagem(ns) · emoção predominante: {emocao_dominante}"):
+                    for mensagem in df_mensagens.loc[representantes, "mensagem"]:
+                        st.write(f"- {mensagem}")
+
 st.markdown("---")
 st.caption("Desenvolvido para análise emocional de atendimentos - usando PySentimiento + Streamlit")
\ No newline at end of file